@@ -8,10 +8,14 @@ import traceback
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
 import db_helpers
+from planner import planner_from_env, PlannerBusy, PlannerTimeout
 
 app = Flask(__name__)
 CORS(app)
 
+# Heavy tree/project expansions run here, off the request thread
+planner = planner_from_env()
+
 # NEW: Flask database connection management
 def get_db():
     if 'db' not in g:
@@ -26,8 +30,8 @@ def close_db(e=None):
         db.close()
 
 @app.teardown_appcontext
-def close_db(error):
-    close_db()
+def teardown_db(error):
+    close_db(error)
 
 # NEW: Input validation decorator
 def validate_json(*required_fields):
@@ -58,6 +62,78 @@ def not_found(error):
 def internal_error(error):
     return jsonify({"error": "Internal server error"}), 500
 
+@app.errorhandler(PlannerBusy)
+def planner_busy(error):
+    return jsonify({"error": "Server is busy, try again shortly"}), 503, {"Retry-After": "5"}
+
+@app.errorhandler(PlannerTimeout)
+def planner_timeout(error):
+    return jsonify({"error": "Crafting computation timed out"}), 504
+
+# NEW: Planner jobs. These run on planner threads, so they open their own
+# connection instead of using the request-bound get_db()
+def plan_tree(item, qty):
+    conn = db_helpers.get_db_connection()
+    try:
+        tree = db_helpers.get_full_tree(item, qty, conn)
+        shopping_list = db_helpers.flatten_tree_to_shopping_list(tree, item)
+        return {"tree": tree, "shopping_list": shopping_list}
+    finally:
+        conn.close()
+
+def plan_project(project_id):
+    conn = db_helpers.get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT Name, Description, CreatedAt FROM Projects WHERE ProjectID = ?', (project_id,))
+        proj_row = cursor.fetchone()
+        if not proj_row:
+            return None
+
+        cursor.execute('SELECT ItemName, Tier, Quantity FROM ProjectItems WHERE ProjectID = ?', (project_id,))
+        items = [{"ItemName": r[0], "Tier": r[1], "Quantity": r[2]} for r in cursor.fetchall()]
+
+        # Get the tree and shopping list for all project items
+        all_trees = []
+        all_shopping = {}
+        for i in items:
+            tree = db_helpers.get_full_tree(i["ItemName"], i["Quantity"], conn)
+            all_trees.append({i["ItemName"]: tree})
+            slist = db_helpers.flatten_tree_to_shopping_list(tree, i["ItemName"])
+
+            # Handle new format that might include errors
+            if isinstance(slist, dict) and "shopping_list" in slist:
+                slist = slist["shopping_list"]
+
+            for k, v in slist.items():
+                all_shopping[k] = all_shopping.get(k, 0) + v
+
+        return {
+            "ProjectID": project_id,
+            "Name": proj_row[0],
+            "Description": proj_row[1],
+            "CreatedAt": proj_row[2],
+            "Items": items,
+            "AllTrees": all_trees,
+            "ShoppingList": all_shopping
+        }
+    finally:
+        conn.close()
+
+def plan_database_tree():
+    conn = db_helpers.get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT DISTINCT OutputItem FROM Recipes')
+        all_items = [r[0] for r in cursor.fetchall()]
+
+        all_trees = {}
+        for item in all_items:
+            all_trees[item] = db_helpers.get_full_tree(item, 1, conn)
+        return all_trees
+    finally:
+        conn.close()
+
 # UPDATED: Use Flask's get_db() instead of db_helpers.get_db_connection()
 @app.route('/api/inventory', methods=['GET'])
 def get_inventory():
@@ -192,10 +268,10 @@ def get_tree():
         if not isinstance(qty, int) or qty <= 0:
             return jsonify({"error": "Quantity must be a positive integer"}), 400
         
-        tree = db_helpers.get_full_tree(item, qty)
-        shopping_list = db_helpers.flatten_tree_to_shopping_list(tree, item)
-        
-        return jsonify({"tree": tree, "shopping_list": shopping_list})
+        # Identical concurrent requests share one expansion
+        return jsonify(planner.run(("tree", item, qty), plan_tree, item, qty))
+    except (PlannerBusy, PlannerTimeout):
+        raise
     except Exception as e:
         print(f"Error generating tree: {traceback.format_exc()}")
         return jsonify({"error": "Failed to generate crafting tree"}), 500
@@ -248,40 +324,12 @@ def create_project():
 @app.route('/api/project/<int:project_id>', methods=['GET'])
 def get_project(project_id):
     try:
-        db = get_db()
-        cursor = db.cursor()
-        cursor.execute('SELECT Name, Description, CreatedAt FROM Projects WHERE ProjectID = ?', (project_id,))
-        proj_row = cursor.fetchone()
-        if not proj_row:
+        project = planner.run(("project", project_id), plan_project, project_id)
+        if project is None:
             return jsonify({"error": "Project not found"}), 404
-
-        cursor.execute('SELECT ItemName, Tier, Quantity FROM ProjectItems WHERE ProjectID = ?', (project_id,))
-        items = [{"ItemName": r['ItemName'], "Tier": r['Tier'], "Quantity": r['Quantity']} for r in cursor.fetchall()]
-
-        # Get the tree and shopping list for all project items
-        all_trees = []
-        all_shopping = {}
-        for i in items:
-            tree = db_helpers.get_full_tree(i["ItemName"], i["Quantity"])
-            all_trees.append({i["ItemName"]: tree})
-            slist = db_helpers.flatten_tree_to_shopping_list(tree, i["ItemName"])
-            
-            # Handle new format that might include errors
-            if isinstance(slist, dict) and "shopping_list" in slist:
-                slist = slist["shopping_list"]
-            
-            for k, v in slist.items():
-                all_shopping[k] = all_shopping.get(k, 0) + v
-
-        return jsonify({
-            "ProjectID": project_id,
-            "Name": proj_row['Name'],
-            "Description": proj_row['Description'],
-            "CreatedAt": proj_row['CreatedAt'],
-            "Items": items,
-            "AllTrees": all_trees,
-            "ShoppingList": all_shopping
-        })
+        return jsonify(project)
+    except (PlannerBusy, PlannerTimeout):
+        raise
     except Exception as e:
         print(f"Error fetching project: {traceback.format_exc()}")
         return jsonify({"error": "Failed to fetch project"}), 500
@@ -339,18 +387,13 @@ def delete_project(project_id):
 @app.route('/api/tree', methods=['GET'])
 def get_full_database_tree():
     try:
-        db = get_db()
-        cursor = db.cursor()
-        cursor.execute('SELECT DISTINCT OutputItem FROM Recipes')
-        all_items = [r['OutputItem'] for r in cursor.fetchall()]
-        
-        all_trees = {}
-        for item in all_items:
-            all_trees[item] = db_helpers.get_full_tree(item, 1)
-        return jsonify(all_trees)
+        return jsonify(planner.run(("database_tree",), plan_database_tree))
+    except (PlannerBusy, PlannerTimeout):
+        raise
     except Exception as e:
         print(f"Error generating full tree: {traceback.format_exc()}")
         return jsonify({"error": "Failed to generate database tree"}), 500
 
+# Debug server only. For production: pip install -r ../requirements.txt && python serve.py
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,74 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+
+class PlannerBusy(Exception):
+    """Raised when too many computations or callers are already in flight"""
+
+
+class PlannerTimeout(Exception):
+    """Raised when a computation does not finish within the planner timeout"""
+
+
+class Planner:
+    """
+    Runs heavy tree/project planning on a bounded thread pool.
+
+    Concurrent calls with the same key share one in-flight computation, so a
+    burst of identical requests costs a single expansion. Nothing is cached
+    once the computation finishes; the next request starts a fresh one.
+
+    max_pending bounds distinct computations, max_waiters bounds callers
+    blocked in run() across all keys. Keep max_waiters below the server's
+    thread count so light endpoints always have a thread to run on.
+    """
+
+    def __init__(self, max_workers=4, max_pending=4, max_waiters=6, timeout=30.0):
+        self.max_pending = max_pending
+        self.max_waiters = max_waiters
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="planner")
+        self._inflight = {}
+        self._waiting = 0
+        # RLock: add_done_callback runs inline if the future already finished
+        self._lock = threading.RLock()
+
+    def run(self, key, fn, *args):
+        with self._lock:
+            if self._waiting >= self.max_waiters:
+                raise PlannerBusy(f"{self._waiting} callers already waiting")
+            future = self._inflight.get(key)
+            if future is None:
+                if len(self._inflight) >= self.max_pending:
+                    raise PlannerBusy(f"{len(self._inflight)} computations already pending")
+                future = self._executor.submit(fn, *args)
+                self._inflight[key] = future
+                future.add_done_callback(lambda f: self._forget(key, f))
+            self._waiting += 1
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # The worker keeps running; later identical requests still join it
+            raise PlannerTimeout(f"{key!r} did not finish within {self.timeout}s")
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def planner_from_env():
+    return Planner(
+        max_workers=int(os.environ.get("BITCRAFT_PLANNER_WORKERS", 4)),
+        max_pending=int(os.environ.get("BITCRAFT_PLANNER_MAX_PENDING", 4)),
+        max_waiters=int(os.environ.get("BITCRAFT_PLANNER_MAX_WAITERS", 6)),
+        timeout=float(os.environ.get("BITCRAFT_PLANNER_TIMEOUT", 30)),
+    )
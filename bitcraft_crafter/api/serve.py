@@ -0,0 +1,33 @@
+"""
+Production entry point. `python app.py` is still the debug server.
+
+    pip install -r ../requirements.txt
+    python serve.py
+
+Serves the app with waitress. Tree/project expansion runs on the planner
+pool in app.py, and the planner turns away callers (503) before they can
+occupy every server thread, so light endpoints keep a thread to run on.
+"""
+import os
+
+from waitress import serve
+
+from app import app, planner
+
+if __name__ == '__main__':
+    threads = int(os.environ.get("BITCRAFT_THREADS", 8))
+    if planner.max_waiters >= threads:
+        raise SystemExit(
+            f"BITCRAFT_PLANNER_MAX_WAITERS ({planner.max_waiters}) must be below "
+            f"BITCRAFT_THREADS ({threads}) or heavy requests can block every server thread"
+        )
+
+    try:
+        serve(
+            app,
+            host=os.environ.get("BITCRAFT_HOST", "0.0.0.0"),
+            port=int(os.environ.get("BITCRAFT_PORT", 5000)),
+            threads=threads,
+        )
+    finally:
+        planner.shutdown()
@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+
+from planner import Planner, PlannerBusy, PlannerTimeout
+
+
+def blocking_job(release, calls):
+    def job(value):
+        calls.append(value)
+        release.wait(5)
+        return {"value": value}
+    return job
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.01)
+
+
+def test_identical_keys_share_one_call():
+    planner = Planner(max_workers=2, max_pending=2, max_waiters=20)
+    release = threading.Event()
+    calls = []
+    job = blocking_job(release, calls)
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(planner.run("k", job, 1))) for _ in range(10)]
+    for t in threads:
+        t.start()
+    wait_for(lambda: planner._waiting == 10)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert calls == [1]
+    assert len(results) == 10
+    assert all(r is results[0] for r in results)
+
+
+def test_busy_when_too_many_pending():
+    planner = Planner(max_workers=2, max_pending=2, max_waiters=20)
+    release = threading.Event()
+    job = blocking_job(release, [])
+
+    threads = [threading.Thread(target=planner.run, args=(key, job, key)) for key in ("a", "b")]
+    for t in threads:
+        t.start()
+    wait_for(lambda: len(planner._inflight) == 2)
+
+    with pytest.raises(PlannerBusy):
+        planner.run("c", job, "c")
+
+    release.set()
+    for t in threads:
+        t.join()
+
+
+def test_busy_when_too_many_waiters():
+    planner = Planner(max_workers=1, max_pending=4, max_waiters=2)
+    release = threading.Event()
+    job = blocking_job(release, [])
+
+    threads = [threading.Thread(target=planner.run, args=("k", job, 1)) for _ in range(2)]
+    for t in threads:
+        t.start()
+    wait_for(lambda: planner._waiting == 2)
+
+    # Even a caller that would coalesce onto "k" is turned away
+    with pytest.raises(PlannerBusy):
+        planner.run("k", job, 1)
+
+    release.set()
+    for t in threads:
+        t.join()
+    assert planner._waiting == 0
+
+
+def test_timeout_keeps_computation_in_flight():
+    planner = Planner(max_workers=1, timeout=0.05)
+    release = threading.Event()
+    calls = []
+    job = blocking_job(release, calls)
+
+    with pytest.raises(PlannerTimeout):
+        planner.run("k", job, 1)
+    assert "k" in planner._inflight
+
+    # A retry joins the still-running computation instead of starting another
+    with pytest.raises(PlannerTimeout):
+        planner.run("k", job, 1)
+    assert calls == [1]
+
+    release.set()
+    wait_for(lambda: "k" not in planner._inflight)
+
+
+def test_inflight_cleared_after_success():
+    planner = Planner()
+
+    assert planner.run("k", lambda: 42) == 42
+    wait_for(lambda: not planner._inflight)
+    assert planner._waiting == 0
+
+
+def test_inflight_cleared_after_exception():
+    planner = Planner()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        planner.run("k", fail)
+    wait_for(lambda: not planner._inflight)
+    assert planner._waiting == 0